@@ -3,13 +3,25 @@ package com.sergiy.dev.mockkhttp.interceptor
 import android.content.Context
 import android.util.Log
 import com.google.gson.Gson
+import com.google.gson.JsonIOException
 import okhttp3.*
 import okhttp3.MediaType.Companion.toMediaType
 import okhttp3.ResponseBody.Companion.toResponseBody
 import okio.Buffer
+import java.io.Closeable
 import java.io.IOException
 import java.net.Socket
 import java.net.SocketTimeoutException
+import java.util.concurrent.ArrayBlockingQueue
+import java.util.concurrent.ConcurrentHashMap
+import java.util.concurrent.LinkedBlockingQueue
+import java.util.concurrent.RejectedExecutionException
+import java.util.concurrent.ThreadFactory
+import java.util.concurrent.ThreadPoolExecutor
+import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicBoolean
+import java.util.concurrent.atomic.AtomicInteger
+import java.util.concurrent.atomic.AtomicLong
 
 /**
  * OkHttp Interceptor that captures and sends HTTP requests/responses to IntelliJ MockkHttp plugin.
@@ -38,12 +50,52 @@ class MockkHttpInterceptor @JvmOverloads constructor(
     private val appContext: Context? = context ?: getApplicationContextViaReflection()
     private val gson = Gson()
 
+    /**
+     * Whether the host app is a debug build, read once from BuildConfig.DEBUG
+     * instead of via reflection on every request.
+     */
+    private val isDebugBuild: Boolean by lazy {
+        try {
+            val buildConfigClass = Class.forName("${appContext?.packageName}.BuildConfig")
+            val debugField = buildConfigClass.getDeclaredField("DEBUG")
+            debugField.getBoolean(null)
+        } catch (e: Exception) {
+            // If we can't determine build type, assume it's safe (debug)
+            true
+        }
+    }
+
+    private val endpoint = "$pluginHost:$pluginPort"
+
+    // Plugin connection state cache, shared by all interceptors for the same endpoint
+    private val pingState = pingStates.getOrPut(endpoint) { PingState() }
+
+    // Idle keep-alive connections to the plugin, shared by all interceptors for the same endpoint
+    private val idleConnections = connectionPools.getOrPut(endpoint) {
+        ArrayBlockingQueue(MAX_IDLE_CONNECTIONS)
+    }
+
+    // Recording-mode flows waiting to be decoded and sent in the next batch
+    private val pendingFlows = ArrayBlockingQueue<FlowSnapshot>(SEND_QUEUE_CAPACITY)
+    private val flushScheduled = AtomicBoolean(false)
+
     companion object {
         private const val TAG = "MockkHttpInterceptor"
         private const val CONNECTION_TIMEOUT_MS = 5000
-        private const val READ_TIMEOUT_MS = 60000  // 60s for user to modify
+        private const val RESPONSE_GRACE_MS = 2000 // Extra wait for the plugin's reply after its own timeout
+        private const val MAX_DEBUG_TIMEOUT_MS = 30 * 60 * 1000  // Upper bound for debugTimeoutMs (30 min)
         private const val PING_TIMEOUT_MS = 500    // Fast ping timeout
         private const val PING_CACHE_DURATION_MS = 5000  // Cache ping result for 5s
+        private const val MAX_IDLE_CONNECTIONS = 4       // Keep-alive sockets kept per plugin endpoint
+        private const val CONNECTION_MAX_IDLE_MS = 50_000L // Below the plugin's 60s client idle timeout
+        private const val MAX_BODY_BYTES = 1024L * 1024  // Text bodies above 1MB are truncated
+        private const val TRUNCATED_MARKER = "\n...[truncated]"
+        private const val SEND_THREADS = 4               // Max concurrent Recording-mode batch flushes
+        private const val SEND_QUEUE_CAPACITY = 256      // Pending Recording-mode flows before dropping
+        private const val MAX_BATCH_SIZE = 64            // Max flows sent in one batch
+        private const val MAX_BATCH_BYTES = 1024L * 1024 // Body bytes after which a batch is cut
+        private const val MAX_QUEUED_BYTES = 8L * 1024 * 1024 // Pending body bytes before dropping
+        private const val BATCH_WINDOW_MS = 50L          // Time to let a batch fill before flushing
 
         /**
          * Enable/disable interceptor globally.
@@ -59,15 +111,72 @@ class MockkHttpInterceptor @JvmOverloads constructor(
         @JvmStatic
         var debugMode = true
 
-        // Plugin connection state cache
-        @Volatile
-        private var lastPingTime: Long = 0
-        @Volatile
-        private var lastPingResult: Boolean = false
+        /**
+         * How long a paused flow waits for the user in Debug mode.
+         * Sent to the plugin with each flow, which releases the flow with the
+         * original response (and closes its dialog) once this expires.
+         * Must be positive; values above MAX_DEBUG_TIMEOUT_MS are capped.
+         */
+        @JvmStatic
         @Volatile
-        private var failedAttempts: Int = 0
+        var debugTimeoutMs = 60000  // 60s for user to modify
+            set(value) {
+                require(value > 0) { "debugTimeoutMs must be positive, was $value" }
+                field = value.coerceAtMost(MAX_DEBUG_TIMEOUT_MS)
+            }
+
+        // Media types whose bodies are binary (see isBinaryMediaType)
+        private val BINARY_TYPES = setOf("image", "audio", "video", "font")
+        private val BINARY_SUBTYPES = setOf(
+            "octet-stream", "protobuf", "x-protobuf", "grpc", "zip", "gzip", "pdf", "wasm"
+        )
+
+        // Headers not sent to the plugin (case-insensitive): hop-by-hop headers that are
+        // meaningless once the body is decoded (and break mocks if replayed), plus client hints
+        private val SKIPPED_HEADERS = sortedSetOf(
+            String.CASE_INSENSITIVE_ORDER,
+            "Connection", "Keep-Alive", "Proxy-Connection", "Transfer-Encoding", "TE", "Trailer", "Upgrade",
+            "sec-ch-ua", "sec-ch-ua-mobile", "sec-ch-ua-platform"
+        )
+
         private const val MAX_FAILED_ATTEMPTS = 3  // After 3 fails, stop trying
 
+        /**
+         * Plugin connection state caches keyed by "host:port".
+         * Shared across instances so that clients built later reuse the cached ping
+         * result and failsafe state instead of pinging the plugin again.
+         */
+        private val pingStates = ConcurrentHashMap<String, PingState>()
+
+        /**
+         * Keep-alive connection pools keyed by "host:port".
+         * The Gradle plugin injects a new interceptor into every OkHttpClient it builds,
+         * so pools live here rather than per instance to keep sockets bounded per process.
+         */
+        private val connectionPools = ConcurrentHashMap<String, ArrayBlockingQueue<PluginConnection>>()
+
+        // Body bytes held by pending Recording-mode flows across all interceptors
+        private val queuedBytes = AtomicLong(0)
+
+        /**
+         * Bounded pool that flushes Recording-mode batches, shared by all interceptor instances.
+         * Each interceptor has at most one flush task queued or running at a time.
+         * Threads are daemons and time out when idle, so no explicit shutdown is needed.
+         */
+        private val sendExecutor = ThreadPoolExecutor(
+            SEND_THREADS,
+            SEND_THREADS,
+            30L,
+            TimeUnit.SECONDS,
+            LinkedBlockingQueue(),
+            object : ThreadFactory {
+                private val count = AtomicInteger()
+                override fun newThread(runnable: Runnable): Thread {
+                    return Thread(runnable, "mockk-rpc-${count.incrementAndGet()}").apply { isDaemon = true }
+                }
+            }
+        ).apply { allowCoreThreadTimeOut(true) }
+
         /**
          * Obtain Application context via reflection when constructor context is null.
          * This is used when Gradle plugin injects the interceptor without access to Context.
@@ -86,17 +195,9 @@ class MockkHttpInterceptor @JvmOverloads constructor(
     override fun intercept(chain: Interceptor.Chain): Response {
         // SECURITY: Double-check we're not in a release build
         // This is a fail-safe in case the Gradle plugin was bypassed
-        try {
-            val buildConfigClass = Class.forName("${appContext?.packageName}.BuildConfig")
-            val debugField = buildConfigClass.getDeclaredField("DEBUG")
-            val isDebugBuild = debugField.getBoolean(null)
-
-            if (!isDebugBuild) {
-                // Pass through without intercepting
-                return chain.proceed(chain.request())
-            }
-        } catch (e: Exception) {
-            // If we can't determine build type, assume it's safe (debug)
+        if (!isDebugBuild) {
+            // Pass through without intercepting
+            return chain.proceed(chain.request())
         }
 
         if (!isEnabled) {
@@ -143,14 +244,16 @@ class MockkHttpInterceptor @JvmOverloads constructor(
      * After MAX_FAILED_ATTEMPTS consecutive failures, stops trying to connect.
      */
     private fun isPluginConnected(): Boolean {
+        val state = pingState
+
         // If we've failed too many times, stop trying (failsafe mode)
-        if (failedAttempts >= MAX_FAILED_ATTEMPTS) {
+        if (state.failedAttempts >= MAX_FAILED_ATTEMPTS) {
             return false
         }
 
         // Use cached result if still valid (within PING_CACHE_DURATION_MS)
         val now = System.currentTimeMillis()
-        if (now - lastPingTime < PING_CACHE_DURATION_MS) return lastPingResult
+        if (now - state.lastPingTime < PING_CACHE_DURATION_MS) return state.lastPingResult
 
         // Perform actual ping with fast timeout
         val connected = try {
@@ -164,19 +267,19 @@ class MockkHttpInterceptor @JvmOverloads constructor(
                 val success = read > 0 && String(response, 0, read).startsWith("PONG")
 
                 if (success) {
-                    failedAttempts = 0  // Reset failure counter on success
+                    state.failedAttempts = 0  // Reset failure counter on success
                 }
 
                 success
             }
         } catch (e: Exception) {
-            failedAttempts++
+            state.failedAttempts++
             false
         }
 
         // Update cache
-        lastPingTime = now
-        lastPingResult = connected
+        state.lastPingTime = now
+        state.lastPingResult = connected
 
         return connected
     }
@@ -191,32 +294,24 @@ class MockkHttpInterceptor @JvmOverloads constructor(
         duration: Long
     ): Response? {
         return try {
-            val socket = Socket(pluginHost, pluginPort)
-            socket.soTimeout = READ_TIMEOUT_MS
-
-            socket.use {
-                val flowData = serializeFlow(request, originalResponse, duration)
-
-                // Send flow data
-                val json = gson.toJson(flowData) + "\n"
-                it.getOutputStream().write(json.toByteArray())
-                it.getOutputStream().flush()
+            val flowData = serializeFlow(request, originalResponse, duration)
 
+            // Wait as long as the plugin may hold the flow (the timeout sent with it), plus a grace period
+            val pauseTimeoutMs = flowData.debugTimeoutMs ?: debugTimeoutMs.toLong()
+            val readTimeoutMs = (pauseTimeoutMs + RESPONSE_GRACE_MS).coerceAtMost(Int.MAX_VALUE.toLong()).toInt()
 
-                // WAIT for modified response (blocks thread)
-                val reader = it.getInputStream().bufferedReader()
-                val modifiedJson = reader.readLine()
+            // Send flow data and WAIT for modified response (blocks thread)
+            val modifiedJson = exchange(flowData, readTimeoutMs)
 
-                if (modifiedJson == null || modifiedJson == "PONG") {
-                    // Plugin sent PONG (ping response) or nothing, use original
-                    return originalResponse
-                }
+            if (modifiedJson == "PONG") {
+                // Plugin sent PONG (ping response), use original
+                return originalResponse
+            }
 
-                val modifiedData = gson.fromJson(modifiedJson, ModifiedResponseData::class.java)
+            val modifiedData = gson.fromJson(modifiedJson, ModifiedResponseData::class.java)
 
-                // Build modified response
-                buildModifiedResponse(originalResponse, modifiedData)
-            }
+            // Build modified response
+            buildModifiedResponse(originalResponse, modifiedData, flowData.response)
         } catch (e: SocketTimeoutException) {
             null
         } catch (e: IOException) {
@@ -225,7 +320,10 @@ class MockkHttpInterceptor @JvmOverloads constructor(
     }
 
     /**
-     * Send flow to plugin async without waiting.
+     * Queue flow to be sent to plugin async without waiting.
+     * Flows are batched: one send carries up to MAX_BATCH_SIZE flows collected
+     * over BATCH_WINDOW_MS. When the queue is full, or queued bodies exceed
+     * MAX_QUEUED_BYTES, the flow is dropped (recording is best-effort).
      * Used in Recording mode.
      */
     private fun sendToPluginAsync(
@@ -233,21 +331,169 @@ class MockkHttpInterceptor @JvmOverloads constructor(
         response: Response,
         duration: Long
     ) {
-        Thread {
-            try {
-                val socket = Socket(pluginHost, pluginPort)
-                socket.soTimeout = CONNECTION_TIMEOUT_MS
+        // Only snapshot here: the response body must be peeked before it's handed back to the
+        // caller, but decoding and JSON encoding happen on the flush thread
+        val snapshot = snapshotFlow(request, response, duration)
+
+        // Drop the flow if the queues already hold too much body data
+        if (queuedBytes.addAndGet(snapshot.byteSize) > MAX_QUEUED_BYTES) {
+            queuedBytes.addAndGet(-snapshot.byteSize)
+            return
+        }
+        if (pendingFlows.offer(snapshot)) {
+            scheduleFlush()
+        } else {
+            queuedBytes.addAndGet(-snapshot.byteSize)
+        }
+    }
 
-                socket.use {
-                    val flowData = serializeFlow(request, response, duration)
-                    val json = gson.toJson(flowData) + "\n"
-                    it.getOutputStream().write(json.toByteArray())
-                    it.getOutputStream().flush()
+    private fun scheduleFlush() {
+        if (!flushScheduled.compareAndSet(false, true)) return
+        try {
+            sendExecutor.execute { flushPendingFlows() }
+        } catch (e: RejectedExecutionException) {
+            flushScheduled.set(false)
+        }
+    }
 
+    /**
+     * Send all queued flows to the plugin in batches of up to MAX_BATCH_SIZE flows.
+     * A batch is also cut once its bodies reach MAX_BATCH_BYTES, so each one
+     * can be written and acknowledged within CONNECTION_TIMEOUT_MS.
+     */
+    private fun flushPendingFlows() {
+        try {
+            // Let the batch fill up before sending
+            Thread.sleep(BATCH_WINDOW_MS)
+
+            while (true) {
+                val batch = ArrayList<FlowData>(MAX_BATCH_SIZE)
+                var batchBytes = 0L
+                while (batch.size < MAX_BATCH_SIZE && batchBytes < MAX_BATCH_BYTES) {
+                    val snapshot = pendingFlows.poll() ?: break
+                    queuedBytes.addAndGet(-snapshot.byteSize)
+                    batchBytes += snapshot.byteSize
+                    batch.add(buildFlowData(snapshot))
+                }
+                if (batch.isEmpty()) break
+
+                try {
+                    // Reply is ignored, but must be consumed so the connection can be reused
+                    exchange(batch, CONNECTION_TIMEOUT_MS)
+                } catch (e: Exception) {
+                    // Recording is best-effort: never let a failure escape the pool thread
                 }
-            } catch (e: Exception) {
             }
-        }.start()
+        } catch (e: Exception) {
+            // Interrupted, or a flow failed to decode: stop this flush, remaining flows are rescheduled
+        } finally {
+            flushScheduled.set(false)
+            // A flow may have been queued after the last drain but before the flag was cleared
+            if (pendingFlows.isNotEmpty()) {
+                scheduleFlush()
+            }
+        }
+    }
+
+    /**
+     * Send a flow (or a batch of flows) and read the plugin's one-line reply.
+     * Reuses an idle keep-alive connection when available. If a reused connection
+     * turns out to be stale (plugin closed it), retries once on a fresh one.
+     * A timeout is never retried: the plugin may still be holding the flow.
+     */
+    private fun exchange(payload: Any, readTimeoutMs: Int): String {
+        val pooled = pollIdleConnection()
+        if (pooled != null) {
+            try {
+                return exchangeOn(pooled, payload, readTimeoutMs)
+            } catch (e: SocketTimeoutException) {
+                throw e
+            } catch (e: IOException) {
+                // Stale connection, fall through to a fresh one
+            }
+        }
+        return exchangeOn(PluginConnection(Socket(pluginHost, pluginPort)), payload, readTimeoutMs)
+    }
+
+    /**
+     * Take an idle connection from the pool, closing any the plugin has likely already
+     * dropped (idle longer than CONNECTION_MAX_IDLE_MS).
+     */
+    private fun pollIdleConnection(): PluginConnection? {
+        while (true) {
+            val connection = idleConnections.poll() ?: return null
+            if (System.currentTimeMillis() - connection.lastUsed < CONNECTION_MAX_IDLE_MS) {
+                return connection
+            }
+            connection.close()
+        }
+    }
+
+    private fun exchangeOn(connection: PluginConnection, payload: Any, readTimeoutMs: Int): String {
+        try {
+            connection.socket.soTimeout = readTimeoutMs
+            writePayload(connection, payload)
+            val reply = connection.reader.readLine() ?: throw IOException("Plugin closed connection")
+
+            // Return connection to the pool, or close it if the pool is full
+            connection.lastUsed = System.currentTimeMillis()
+            if (!idleConnections.offer(connection)) {
+                connection.close()
+            }
+            return reply
+        } catch (e: IOException) {
+            connection.close()
+            throw e
+        }
+    }
+
+    /**
+     * Write a flow (JSON object) or batch of flows (JSON array) as a single JSON line.
+     * Gson streams straight into the socket writer, so the payload is never
+     * materialized as an intermediate String/ByteArray.
+     * Gson wraps write failures in JsonIOException; they're unwrapped so callers
+     * can treat them like any other socket error.
+     */
+    private fun writePayload(connection: PluginConnection, payload: Any) {
+        try {
+            gson.toJson(payload, connection.writer)
+        } catch (e: JsonIOException) {
+            throw e.cause as? IOException ?: IOException(e)
+        }
+        connection.writer.write("\n")
+        connection.writer.flush()
+    }
+
+    /**
+     * Cached plugin reachability for one endpoint (see isPluginConnected).
+     */
+    private class PingState {
+        @Volatile
+        var lastPingTime: Long = 0
+        @Volatile
+        var lastPingResult: Boolean = false
+        @Volatile
+        var failedAttempts: Int = 0
+    }
+
+    /**
+     * Keep-alive socket to the plugin with its reader/writer.
+     * Reader and writer live as long as the socket so no buffered bytes are lost between flows.
+     */
+    private class PluginConnection(val socket: Socket) : Closeable {
+        val reader = socket.getInputStream().bufferedReader(Charsets.UTF_8)
+        val writer = socket.getOutputStream().bufferedWriter(Charsets.UTF_8)
+
+        // When the connection last completed an exchange (see pollIdleConnection)
+        @Volatile
+        var lastUsed: Long = System.currentTimeMillis()
+
+        override fun close() {
+            try {
+                socket.close()
+            } catch (e: IOException) {
+            }
+        }
     }
 
     /**
@@ -258,59 +504,108 @@ class MockkHttpInterceptor @JvmOverloads constructor(
         response: Response,
         duration: Long
     ): FlowData {
-        // Read request body safely (if available)
-        val requestBody = try {
-            // Request body is already consumed at this point, we can't read it
-            // This would require using a logging interceptor before this one
-            // For now, we'll just capture headers and URL
-            ""
+        return buildFlowData(snapshotFlow(request, response, duration))
+    }
+
+    /**
+     * Capture what must be read before the response is handed back to the caller:
+     * the peeked body bytes. Request, headers and the rest are immutable and just referenced.
+     */
+    private fun snapshotFlow(
+        request: Request,
+        response: Response,
+        duration: Long
+    ): FlowSnapshot {
+        val contentType = response.body?.contentType()
+
+        // Read response body safely without consuming it.
+        // Binary bodies are skipped: decoding them as text is lossy and wastes a full pass.
+        // Peek one extra byte so we can tell whether the body was cut off at MAX_BODY_BYTES.
+        val bodyBytes = if (isBinaryMediaType(contentType)) null else try {
+            response.peekBody(MAX_BODY_BYTES + 1).bytes()
         } catch (e: Exception) {
-            ""
+            null
         }
 
-        // Read response body safely without consuming it
-        val responseBodyString = try {
-            // Use 5MB max buffer to support images and allow binary modification
-            // Note: This is the MAX size, actual memory usage equals response size
-            val contentLength = response.body?.contentLength() ?: 0
-            val maxSize = if (contentLength > 0) {
-                minOf(contentLength, 5 * 1024 * 1024) // Max 5MB
-            } else {
-                5 * 1024 * 1024 // Default 5MB
-            }
+        return FlowSnapshot(
+            request = request,
+            statusCode = response.code,
+            responseHeaders = response.headers,
+            contentType = contentType,
+            bodyBytes = bodyBytes,
+            originalSize = response.body?.contentLength() ?: -1,
+            timestamp = System.currentTimeMillis(),
+            duration = duration
+        )
+    }
 
-            val body = response.peekBody(maxSize).string()
-            body
-        } catch (e: Exception) {
-            ""
+    /**
+     * Decode a snapshot into FlowData. Safe to run on any thread.
+     */
+    private fun buildFlowData(snapshot: FlowSnapshot): FlowData {
+        // Request body is already consumed at this point, we can't read it
+        // This would require using a logging interceptor before this one
+        // For now, we'll just capture headers and URL
+        val requestBody = ""
+
+        // Text bodies are capped at MAX_BODY_BYTES; larger ones are truncated and flagged
+        val bytes = snapshot.bodyBytes
+        val charset = snapshot.contentType?.charset(Charsets.UTF_8) ?: Charsets.UTF_8
+        val bodyTruncated = bytes != null && bytes.size > MAX_BODY_BYTES
+        val responseBodyString = when {
+            bytes == null -> ""
+            bodyTruncated -> String(bytes, 0, MAX_BODY_BYTES.toInt(), charset) + TRUNCATED_MARKER
+            else -> String(bytes, charset)
         }
 
         return FlowData(
             flowId = java.util.UUID.randomUUID().toString(),
             request = RequestData(
-                method = request.method,
-                url = request.url.toString(),
-                headers = request.headers.toMap(),
+                method = snapshot.request.method,
+                url = snapshot.request.url.toString(),
+                headers = snapshot.request.headers.toMap(),
                 body = requestBody
             ),
             response = ResponseData(
-                statusCode = response.code,
-                headers = response.headers.toMap(),
-                body = responseBodyString
+                statusCode = snapshot.statusCode,
+                headers = snapshot.responseHeaders.toMap(),
+                body = responseBodyString,
+                bodyTruncated = bodyTruncated,
+                originalSize = snapshot.originalSize
             ),
-            timestamp = System.currentTimeMillis(),
-            duration = duration,
+            timestamp = snapshot.timestamp,
+            duration = snapshot.duration,
             projectId = null,  // Will be set by Gradle plugin injection
-            packageName = appContext?.packageName  // Include package name for routing
+            packageName = appContext?.packageName,  // Include package name for routing
+            debugTimeoutMs = debugTimeoutMs.toLong()
         )
     }
 
+    /**
+     * Raw flow captured on the calling thread (see snapshotFlow).
+     * bodyBytes is null for binary or unreadable bodies.
+     */
+    private class FlowSnapshot(
+        val request: Request,
+        val statusCode: Int,
+        val responseHeaders: Headers,
+        val contentType: MediaType?,
+        val bodyBytes: ByteArray?,
+        val originalSize: Long,
+        val timestamp: Long,
+        val duration: Long
+    ) {
+        val byteSize: Long get() = bodyBytes?.size?.toLong() ?: 0L
+    }
+
     /**
      * Build modified Response from plugin data.
+     * [sent] is the response as it was sent to the plugin for this flow.
      */
     private fun buildModifiedResponse(
         original: Response,
-        modified: ModifiedResponseData
+        modified: ModifiedResponseData,
+        sent: ResponseData
     ): Response {
 
         // If nothing was modified, return original as-is
@@ -322,8 +617,13 @@ class MockkHttpInterceptor @JvmOverloads constructor(
         val originalBodySize = original.body?.contentLength() ?: 0
 
 
+        // Binary bodies are sent to the plugin as "", so an untouched empty body means "keep original bytes".
+        // A truncated body returned unchanged can't be round-tripped either, so it also keeps the original bytes.
+        val keepOriginalBody = (modified.body.isNullOrEmpty() && isBinaryMediaType(original.body?.contentType())) ||
+            (sent.bodyTruncated && modified.body == sent.body)
+
         // If body was modified, use it. Otherwise, keep original body.
-        val responseBody = if (modified.body != null) {
+        val responseBody = if (modified.body != null && !keepOriginalBody) {
             val contentType = original.body?.contentType() ?: "application/json".toMediaType()
             val newBody = modified.body.toResponseBody(contentType)
             newBody
@@ -355,11 +655,24 @@ class MockkHttpInterceptor @JvmOverloads constructor(
     }
 
     /**
-     * Convert OkHttp Headers to Map.
+     * Whether a body of this media type is binary and should not be decoded as text.
+     */
+    private fun isBinaryMediaType(mediaType: MediaType?): Boolean {
+        if (mediaType == null) return false
+        return mediaType.type in BINARY_TYPES || mediaType.subtype in BINARY_SUBTYPES
+    }
+
+    /**
+     * Convert OkHttp Headers to Map in a single pass, skipping SKIPPED_HEADERS.
+     * Later values win for repeated names, matching Headers.get(name).
      */
     private fun Headers.toMap(): Map<String, String> {
-        return names().associateWith { name ->
-            get(name) ?: ""
+        val map = LinkedHashMap<String, String>(size)
+        for (i in 0 until size) {
+            val name = name(i)
+            if (name in SKIPPED_HEADERS) continue
+            map[name] = value(i)
         }
+        return map
     }
 }
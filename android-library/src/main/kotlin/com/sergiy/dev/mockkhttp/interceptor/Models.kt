@@ -10,7 +10,8 @@ data class FlowData(
     val timestamp: Long,
     val duration: Long,
     val projectId: String? = null,      // Optional: helps route to correct project
-    val packageName: String? = null     // Optional: app package name for routing
+    val packageName: String? = null,    // Optional: app package name for routing
+    val debugTimeoutMs: Long? = null    // Optional: how long the plugin may hold a paused flow
 )
 
 /**
@@ -29,7 +30,9 @@ data class RequestData(
 data class ResponseData(
     val statusCode: Int,
     val headers: Map<String, String>,
-    val body: String
+    val body: String,
+    val bodyTruncated: Boolean = false,  // True if body was cut off at the size cap
+    val originalSize: Long = -1          // Content-Length of the original body, -1 if unknown
 )
 
 /**
@@ -1,17 +1,21 @@
 package com.sergiy.dev.mockkhttp.proxy
 
 import com.google.gson.Gson
+import com.google.gson.stream.JsonReader
 import com.intellij.openapi.application.ApplicationManager
 import com.intellij.openapi.components.Service
 import com.intellij.openapi.diagnostic.Logger
+import com.intellij.openapi.diagnostic.debug
 import com.intellij.openapi.project.Project
+import com.intellij.util.concurrency.AppExecutorUtil
 import java.io.BufferedReader
-import java.io.PrintWriter
+import java.io.Writer
 import java.net.ServerSocket
 import java.net.Socket
 import java.net.SocketException
+import java.net.SocketTimeoutException
 import java.util.concurrent.CopyOnWriteArrayList
-import kotlin.concurrent.thread
+import java.util.concurrent.Future
 
 /**
  * Global application-level server that listens for connections from MockkHttpInterceptor in Android apps.
@@ -26,8 +30,9 @@ class GlobalOkHttpInterceptorServer {
     private val gson = Gson()
 
     private var serverSocket: ServerSocket? = null
+    @Volatile
     private var isRunning = false
-    private var serverThread: Thread? = null
+    private var serverTask: Future<*>? = null
 
     // Registry of projects listening for flows (LinkedHashMap maintains insertion order)
     private val registeredProjects = java.util.Collections.synchronizedMap(
@@ -42,6 +47,9 @@ class GlobalOkHttpInterceptorServer {
     companion object {
         const val SERVER_PORT = 9876
 
+        // Idle keep-alive connections are closed after this long without a new flow
+        private const val CLIENT_IDLE_TIMEOUT_MS = 60_000
+
         fun getInstance(): GlobalOkHttpInterceptorServer {
             return ApplicationManager.getApplication().getService(GlobalOkHttpInterceptorServer::class.java)
         }
@@ -113,7 +121,9 @@ class GlobalOkHttpInterceptorServer {
             serverSocket = ServerSocket(SERVER_PORT)
             isRunning = true
 
-            serverThread = thread(isDaemon = true, name = "MockkHttp-Global-Server") {
+            // Accept loop and client handlers run on the platform's shared pool
+            // instead of dedicated threads spawned per connection
+            serverTask = AppExecutorUtil.getAppExecutorService().submit {
                 runServer()
             }
 
@@ -154,14 +164,13 @@ class GlobalOkHttpInterceptorServer {
 
         try {
             serverSocket?.close()
-            serverThread?.interrupt()
-            serverThread?.join(2000)
+            serverTask?.cancel(true)
         } catch (e: Exception) {
             logger.error("Error stopping global server", e)
         }
 
         serverSocket = null
-        serverThread = null
+        serverTask = null
         logger.info("✅ Global interceptor server stopped")
     }
 
@@ -280,9 +289,12 @@ class GlobalOkHttpInterceptorServer {
 
     /**
      * Get all registered projects.
+     * Returns a snapshot copied under the map's lock, safe to iterate from any thread.
      */
     fun getRegisteredProjects(): List<ProjectRegistration> {
-        return registeredProjects.values.toList()
+        return synchronized(registeredProjects) {
+            registeredProjects.values.toList()
+        }
     }
 
     /**
@@ -303,8 +315,8 @@ class GlobalOkHttpInterceptorServer {
                     val clientSocket = serverSocket?.accept() ?: break
                     logger.debug("📱 Client connected: ${clientSocket.inetAddress.hostAddress}")
 
-                    // Handle each client in separate thread
-                    thread(isDaemon = true) {
+                    // Handle each client on a pooled thread
+                    AppExecutorUtil.getAppExecutorService().execute {
                         handleClient(clientSocket)
                     }
                 } catch (e: SocketException) {
@@ -326,72 +338,160 @@ class GlobalOkHttpInterceptorServer {
 
     /**
      * Handle a single client connection.
+     * Connections are kept alive: the client may send several flows (one JSON line each)
+     * over the same socket, so keep serving lines until it disconnects or goes idle.
      */
     private fun handleClient(socket: Socket) {
         socket.use { clientSocket ->
             try {
-                val reader = BufferedReader(clientSocket.getInputStream().reader())
-                val writer = PrintWriter(clientSocket.getOutputStream(), true)
-
-                // Read flow data (one line JSON)
-                val json = reader.readLine()
+                clientSocket.soTimeout = CLIENT_IDLE_TIMEOUT_MS
+                val reader = clientSocket.getInputStream().bufferedReader(Charsets.UTF_8)
+                val writer = clientSocket.getOutputStream().bufferedWriter(Charsets.UTF_8)
+
+                while (isRunning) {
+                    // Dispatch on the first character: '{' flow, '[' batch, anything else a text command
+                    val keepOpen = when (peekMessageStart(reader)) {
+                        -1 -> {
+                            logger.debug("Client disconnected")
+                            false
+                        }
+                        '{'.code -> handleFlowMessage(reader, writer)
+                        '['.code -> handleBatchMessage(reader, writer)
+                        else -> handleCommand(reader, writer)
+                    }
 
-                if (json == null) {
-                    logger.debug("Client disconnected without sending data")
-                    return
+                    if (!keepOpen) return
                 }
+            } catch (e: SocketTimeoutException) {
+                logger.debug("Closing idle client connection")
+            } catch (e: SocketException) {
+                // Reset or broken pipe: the client went away (e.g. closed without reading our reply)
+                logger.debug("Client disconnected: ${e.message}")
+            } catch (e: Exception) {
+                logger.error("Error handling client", e)
+            }
+        }
+    }
 
-                // Handle PING
-                if (json == "PING") {
-                    writer.println("PONG")
-                    logger.debug("📡 PING received, sent PONG")
-                    return
-                }
+    /**
+     * Handle a single flow (JSON object) and reply with the modified response.
+     * Returns false if the connection must be closed.
+     */
+    private fun handleFlowMessage(reader: BufferedReader, writer: Writer): Boolean {
+        // Parse flow data straight from the socket, without buffering the whole line as a String
+        val flowData = try {
+            gson.fromJson<AndroidFlowData>(JsonReader(reader), AndroidFlowData::class.java)
+        } catch (e: Exception) {
+            // Stream position is unknown after a parse error, so drop the connection
+            logger.error("Failed to parse flow data", e)
+            writeResponse(writer, ModifiedResponseData.original())
+            return false
+        }
 
-                // Parse flow data
-                val flowData = try {
-                    gson.fromJson(json, AndroidFlowData::class.java)
-                } catch (e: Exception) {
-                    logger.error("Failed to parse flow data", e)
-                    writer.println(gson.toJson(ModifiedResponseData.original()))
-                    return
-                }
+        val response = handleFlow(flowData)
+
+        writeResponse(writer, response)
+        logger.debug("✅ Response sent back to app")
+        return true
+    }
+
+    /**
+     * Handle a Recording-mode batch (JSON array of flows). Replies to batched flows are not used.
+     * Returns false if the connection must be closed.
+     */
+    private fun handleBatchMessage(reader: BufferedReader, writer: Writer): Boolean {
+        val batch = try {
+            gson.fromJson<Array<AndroidFlowData>>(JsonReader(reader), Array<AndroidFlowData>::class.java)
+        } catch (e: Exception) {
+            // Stream position is unknown after a parse error, so drop the connection
+            logger.error("Failed to parse flow batch", e)
+            return false
+        }
 
-                logger.info("🔴 INTERCEPTED: ${flowData.request.method} ${flowData.request.url}")
-                logger.info("   📦 Package: ${flowData.packageName ?: "unknown"}")
-                logger.info("   🎯 Project hint: ${flowData.projectId ?: "none"}")
+        logger.debug { "📦 Batch of ${batch.size} flow(s) received" }
+        batch.forEach { handleFlow(it) }
 
-                // Route flow to appropriate project(s)
-                val response = routeFlow(flowData)
+        writer.write("OK\n")
+        writer.flush()
+        return true
+    }
 
-                val responseJson = gson.toJson(response)
-                writer.println(responseJson)
-                logger.debug("✅ Response sent back to app")
+    /**
+     * Handle a one-line text command.
+     */
+    private fun handleCommand(reader: BufferedReader, writer: Writer): Boolean {
+        when (val command = reader.readLine()) {
+            "PING" -> {
+                writer.write("PONG\n")
+                writer.flush()
+                logger.debug("📡 PING received, sent PONG")
+                // Pings are one-shot: the client closes right after reading the reply
+                return false
+            }
+            else -> logger.warn("Unknown command from client: $command")
+        }
+        return true
+    }
 
-            } catch (e: Exception) {
-                logger.error("Error handling client", e)
+    /**
+     * Log and route a single intercepted flow.
+     */
+    private fun handleFlow(flowData: AndroidFlowData): ModifiedResponseData {
+        // Per-flow logs are lazy debug messages: they're only built when debug logging is on
+        logger.debug { "🔴 INTERCEPTED: ${flowData.request.method} ${flowData.request.url}" }
+        logger.debug { "   📦 Package: ${flowData.packageName ?: "unknown"}" }
+        logger.debug { "   🎯 Project hint: ${flowData.projectId ?: "none"}" }
+
+        // Route flow to appropriate project(s)
+        return routeFlow(flowData)
+    }
+
+    /**
+     * Skip line breaks left over from the previous message and peek the first character
+     * of the next one without consuming it. Returns -1 when the client has disconnected.
+     */
+    private fun peekMessageStart(reader: BufferedReader): Int {
+        while (true) {
+            reader.mark(1)
+            val c = reader.read()
+            if (c != '\n'.code && c != '\r'.code) {
+                if (c != -1) reader.reset()
+                return c
             }
         }
     }
 
+    /**
+     * Write a response as a single JSON line.
+     * Gson streams straight into the socket writer instead of building an intermediate String.
+     */
+    private fun writeResponse(writer: Writer, response: ModifiedResponseData) {
+        gson.toJson(response, writer)
+        writer.write("\n")
+        writer.flush()
+    }
+
     /**
      * Route a flow to the appropriate project.
      * Returns the modified response (or original if no modifications).
      */
     private fun routeFlow(flowData: AndroidFlowData): ModifiedResponseData {
+        // Route against a consistent snapshot; registrations can change concurrently
+        val projects = getRegisteredProjects()
+
         // If no projects registered, return original
-        if (registeredProjects.isEmpty()) {
+        if (projects.isEmpty()) {
             logger.warn("⚠️ No projects registered, flow will not be captured")
             return ModifiedResponseData.original()
         }
 
         // Try to find the target project
-        val targetProject = findTargetProject(flowData)
+        val targetProject = findTargetProject(flowData, projects)
 
         if (targetProject == null) {
             // NO FALLBACK if projects have explicit filters
             // This prevents flows from wrong apps going to projects with filters
-            val projectsWithFilters = registeredProjects.values.filter { it.packageNameFilter != null }
+            val projectsWithFilters = projects.filter { it.packageNameFilter != null }
 
             if (projectsWithFilters.isNotEmpty()) {
                 // Projects have filters, so flow MUST match one - DON'T fallback
@@ -402,11 +502,12 @@ class GlobalOkHttpInterceptorServer {
             }
 
             // Only use fallback if NO projects have filters (all are catch-all)
-            val fallbackProject = lastActiveProjectId?.let { registeredProjects[it] }
-                ?: registeredProjects.values.lastOrNull()
+            val lastActiveId = lastActiveProjectId
+            val fallbackProject = projects.find { it.projectId == lastActiveId }
+                ?: projects.lastOrNull()
 
             if (fallbackProject != null) {
-                logger.info("⚠️ No filters configured, routing to LAST ACTIVE: ${fallbackProject.projectName}")
+                logger.debug { "⚠️ No filters configured, routing to LAST ACTIVE: ${fallbackProject.projectName}" }
                 return fallbackProject.flowHandler.handleFlow(flowData)
             } else {
                 logger.warn("⚠️ No projects available, flow will not be captured")
@@ -414,19 +515,19 @@ class GlobalOkHttpInterceptorServer {
             }
         }
 
-        logger.info("✅ Routing flow to project: ${targetProject.projectName}")
+        logger.debug { "✅ Routing flow to project: ${targetProject.projectName}" }
         return targetProject.flowHandler.handleFlow(flowData)
     }
 
     /**
      * Find the target project for a flow based on project ID, package name, etc.
      */
-    private fun findTargetProject(flowData: AndroidFlowData): ProjectRegistration? {
+    private fun findTargetProject(flowData: AndroidFlowData, projects: List<ProjectRegistration>): ProjectRegistration? {
         // 1. If flow has explicit project ID, use that
         if (flowData.projectId != null) {
-            val project = registeredProjects[flowData.projectId]
+            val project = projects.find { it.projectId == flowData.projectId }
             if (project != null) {
-                logger.info("🎯 Matched by project ID: ${project.projectName}")
+                logger.debug { "🎯 Matched by project ID: ${project.projectName}" }
                 return project
             }
         }
@@ -434,13 +535,13 @@ class GlobalOkHttpInterceptorServer {
         // 2. STRICT package name filtering - only match projects with explicit filter
         if (flowData.packageName != null) {
             // Find projects with explicit package filter that matches
-            val matchingProjects = registeredProjects.values.filter {
+            val matchingProjects = projects.filter {
                 it.packageNameFilter != null && it.packageNameFilter == flowData.packageName
             }
 
             if (matchingProjects.isNotEmpty()) {
                 val target = matchingProjects.first()
-                logger.info("🎯 Matched by package filter: ${target.projectName} (filter: ${target.packageNameFilter})")
+                logger.debug { "🎯 Matched by package filter: ${target.projectName} (filter: ${target.packageNameFilter})" }
                 if (matchingProjects.size > 1) {
                     logger.warn("⚠️ Multiple projects match package ${flowData.packageName}, using first")
                 }
@@ -449,10 +550,10 @@ class GlobalOkHttpInterceptorServer {
         }
 
         // 3. If only one project registered AND it has NO filter (catch-all), use it
-        if (registeredProjects.size == 1) {
-            val project = registeredProjects.values.first()
+        if (projects.size == 1) {
+            val project = projects.first()
             if (project.packageNameFilter == null) {
-                logger.info("🎯 Using sole registered project (no filter): ${project.projectName}")
+                logger.debug { "🎯 Using sole registered project (no filter): ${project.projectName}" }
                 return project
             } else {
                 // Project has filter but flow doesn't match - DON'T use it
@@ -462,10 +563,10 @@ class GlobalOkHttpInterceptorServer {
         }
 
         // 4. Look for catch-all projects (no filter) if multiple projects
-        val catchAllProjects = registeredProjects.values.filter { it.packageNameFilter == null }
+        val catchAllProjects = projects.filter { it.packageNameFilter == null }
         if (catchAllProjects.isNotEmpty()) {
             val target = catchAllProjects.first()
-            logger.info("🎯 Using catch-all project (no filter): ${target.projectName}")
+            logger.debug { "🎯 Using catch-all project (no filter): ${target.projectName}" }
             if (catchAllProjects.size > 1) {
                 logger.warn("⚠️ Multiple catch-all projects, using first")
             }
@@ -474,7 +575,7 @@ class GlobalOkHttpInterceptorServer {
 
         // 5. No match found
         logger.info("⚠️ Could not find matching project for package '${flowData.packageName}'")
-        logger.info("   Available projects with filters: ${registeredProjects.values.map { "${it.projectName} (${it.packageNameFilter ?: "no filter"})" }}")
+        logger.info("   Available projects with filters: ${projects.map { "${it.projectName} (${it.packageNameFilter ?: "no filter"})" }}")
         return null
     }
 }
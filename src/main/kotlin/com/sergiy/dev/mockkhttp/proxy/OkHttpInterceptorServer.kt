@@ -3,14 +3,25 @@ package com.sergiy.dev.mockkhttp.proxy
 import com.google.gson.Gson
 import com.intellij.openapi.components.Service
 import com.intellij.openapi.project.Project
+import com.intellij.openapi.ui.DialogWrapper
 import com.sergiy.dev.mockkhttp.logging.MockkHttpLogger
 import com.sergiy.dev.mockkhttp.model.HttpFlowData
 import com.sergiy.dev.mockkhttp.model.HttpRequestData
 import com.sergiy.dev.mockkhttp.model.HttpResponseData
+import com.sergiy.dev.mockkhttp.model.MatchType
+import com.sergiy.dev.mockkhttp.model.MockkCollection
+import com.sergiy.dev.mockkhttp.model.StructuredUrl
 import com.sergiy.dev.mockkhttp.store.FlowStore
+import com.sergiy.dev.mockkhttp.store.MockkRulesStore
+import com.sergiy.dev.mockkhttp.store.MockkRulesStore.MockkRule
 import com.sergiy.dev.mockkhttp.ui.DebugInterceptDialog
+import java.net.URI
+import java.net.URL
+import java.util.concurrent.ConcurrentHashMap
 import java.util.concurrent.CountDownLatch
 import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicBoolean
+import java.util.concurrent.atomic.AtomicReference
 import javax.swing.SwingUtilities
 
 /**
@@ -25,7 +36,7 @@ class OkHttpInterceptorServer(private val project: Project) {
 
     private val logger = MockkHttpLogger.getInstance(project)
     private val flowStore = FlowStore.getInstance(project)
-    private val mockkRulesStore = com.sergiy.dev.mockkhttp.store.MockkRulesStore.getInstance(project)
+    private val mockkRulesStore = MockkRulesStore.getInstance(project)
     private val globalServer = GlobalOkHttpInterceptorServer.getInstance()
 
     @Volatile
@@ -34,6 +45,24 @@ class OkHttpInterceptorServer(private val project: Project) {
     @Volatile
     private var currentMode = Mode.RECORDING
 
+    // Recent mock rule lookups keyed by "METHOD url" (null rule = no match), cleared when rules change
+    private val mockMatchCache = ConcurrentHashMap<String, CachedMockMatch>()
+
+    private data class CachedMockMatch(
+        val rule: MockkRule?,
+        val timestamp: Long
+    )
+
+    // Compiled host/path/query patterns, so rule regexes are built once instead of per flow
+    private val regexCache = ConcurrentHashMap<String, Regex>()
+
+    init {
+        mockkRulesStore.addRulesChangedListener {
+            mockMatchCache.clear()
+            regexCache.clear()
+        }
+    }
+
     enum class Mode {
         RECORDING,    // Just capture, don't pause
         DEBUG,        // Pause and show dialog
@@ -44,6 +73,14 @@ class OkHttpInterceptorServer(private val project: Project) {
     companion object {
         const val SERVER_PORT = GlobalOkHttpInterceptorServer.SERVER_PORT
 
+        // Paused flows are released with the original response after this long,
+        // unless the interceptor sends its own timeout with the flow
+        private const val DEFAULT_DEBUG_PAUSE_TIMEOUT_MS = 5 * 60 * 1000L
+
+        // Mock lookups are reused for this long (rule changes also clear the cache)
+        private const val MOCK_MATCH_CACHE_TTL_MS = 2000L
+        private const val MOCK_MATCH_CACHE_MAX_ENTRIES = 500
+
         fun getInstance(project: Project): OkHttpInterceptorServer {
             return project.getService(OkHttpInterceptorServer::class.java)
         }
@@ -160,6 +197,15 @@ class OkHttpInterceptorServer(private val project: Project) {
      */
     private fun handleFlow(androidFlow: AndroidFlowData): ModifiedResponseData {
         logger.info("🔴 FLOW RECEIVED: ${androidFlow.request.method} ${androidFlow.request.url}")
+        if (androidFlow.response.bodyTruncated) {
+            // originalSize is -1 when unknown (chunked or compressed responses)
+            val originalSize = androidFlow.response.originalSize
+            if (originalSize >= 0) {
+                logger.info("   ✂️ Response body truncated by interceptor (original size: $originalSize bytes)")
+            } else {
+                logger.info("   ✂️ Response body truncated by interceptor")
+            }
+        }
 
         // Convert to HttpFlowData
         val httpFlowData = convertToHttpFlowData(androidFlow)
@@ -176,12 +222,11 @@ class OkHttpInterceptorServer(private val project: Project) {
                 // Debug mode: show dialog and wait for user
                 logger.info("⏸️  Flow paused, waiting for user input...")
                 flowStore.addFlow(httpFlowData)
-                val (modifiedResponse, userModified) = showInterceptDialogAndWait(httpFlowData)
+                val (modifiedResponse, userModified) = showInterceptDialogAndWait(httpFlowData, debugPauseTimeoutMs(androidFlow))
 
-                // If user actually modified the response, update the flow in store with modified flag
+                // Flow is no longer paused; also flag it if the user actually modified the response
+                flowStore.addFlow(httpFlowData.copy(paused = false, modified = userModified))
                 if (userModified) {
-                    val modifiedFlow = httpFlowData.copy(modified = true)
-                    flowStore.addFlow(modifiedFlow)
                     logger.info("✏️  Response was modified by user")
                 }
 
@@ -248,12 +293,11 @@ class OkHttpInterceptorServer(private val project: Project) {
 
                 // NOW pause and show dialog for user editing
                 logger.info("⏸️  Flow paused (with mock applied), waiting for user input...")
-                val (modifiedResponse, userModified) = showInterceptDialogAndWait(flowWithMock)
+                val (modifiedResponse, userModified) = showInterceptDialogAndWait(flowWithMock, debugPauseTimeoutMs(androidFlow))
 
-                // If user actually modified, update the flow with modified flag too
+                // Flow is no longer paused; also flag it if the user further modified the response
+                flowStore.addFlow(flowWithMock.copy(paused = false, modified = userModified))
                 if (userModified) {
-                    val modifiedFlow = flowWithMock.copy(modified = true)
-                    flowStore.addFlow(modifiedFlow)
                     logger.info("✏️  Response was further modified by user")
                 }
 
@@ -267,14 +311,20 @@ class OkHttpInterceptorServer(private val project: Project) {
      * Show intercept dialog and WAIT for user response (blocks thread).
      * Returns Pair<ModifiedResponseData, Boolean> where Boolean indicates if user manually modified the response.
      */
-    private fun showInterceptDialogAndWait(flowData: HttpFlowData): Pair<ModifiedResponseData, Boolean> {
+    private fun showInterceptDialogAndWait(flowData: HttpFlowData, timeoutMs: Long): Pair<ModifiedResponseData, Boolean> {
         val latch = CountDownLatch(1)
         var result: ModifiedResponseData? = null
         var userModified = false
+        val openDialog = AtomicReference<DebugInterceptDialog?>()
+        val released = AtomicBoolean(false)
 
         SwingUtilities.invokeLater {
             try {
+                // The flow may have timed out before the EDT got here; don't open a dialog for it
+                if (released.get()) return@invokeLater
+
                 val dialog = DebugInterceptDialog(project, flowData)
+                openDialog.set(dialog)
                 if (dialog.showAndGet()) {
                     val modified = dialog.getModifiedResponse()
                     if (modified != null) {
@@ -336,15 +386,28 @@ class OkHttpInterceptorServer(private val project: Project) {
         }
 
         // BLOCK until user responds (with timeout)
-        val completed = latch.await(5, TimeUnit.MINUTES)
+        val completed = latch.await(timeoutMs, TimeUnit.MILLISECONDS)
         if (!completed) {
-            logger.warn("⚠️  Timeout waiting for user input, using original response")
+            logger.warn("⚠️  Timeout after ${timeoutMs / 1000}s waiting for user input, using original response")
+            released.set(true)
+            // Close the abandoned dialog so it doesn't hold on to the flow
+            SwingUtilities.invokeLater {
+                openDialog.get()?.takeIf { it.isShowing }?.close(DialogWrapper.CANCEL_EXIT_CODE)
+            }
             return Pair(ModifiedResponseData.original(), false)
         }
 
         return Pair(result ?: ModifiedResponseData.original(), userModified)
     }
 
+    /**
+     * How long a paused flow may wait for the user. Uses the app's own timeout when sent,
+     * so the flow is released before the app gives up waiting on it.
+     */
+    private fun debugPauseTimeoutMs(androidFlow: AndroidFlowData): Long {
+        return androidFlow.debugTimeoutMs?.takeIf { it > 0 } ?: DEFAULT_DEBUG_PAUSE_TIMEOUT_MS
+    }
+
     /**
      * Save a mock rule from the debug intercept dialog.
      */
@@ -352,11 +415,11 @@ class OkHttpInterceptorServer(private val project: Project) {
         flowData: HttpFlowData,
         dialog: DebugInterceptDialog,
         response: com.sergiy.dev.mockkhttp.model.ModifiedResponseData,
-        collection: com.sergiy.dev.mockkhttp.model.MockkCollection
+        collection: MockkCollection
     ) {
         try {
             val ruleName = dialog.getMockRuleName()
-            val structuredUrl = com.sergiy.dev.mockkhttp.model.StructuredUrl.fromUrl(flowData.request.url)
+            val structuredUrl = StructuredUrl.fromUrl(flowData.request.url)
 
             mockkRulesStore.addRule(
                 name = ruleName,
@@ -378,8 +441,40 @@ class OkHttpInterceptorServer(private val project: Project) {
 
     /**
      * Find matching mock rule for a flow.
+     * Results (including "no match") are cached briefly so repeated requests to the
+     * same URL skip the full rule scan.
      */
-    private fun findMatchingMockRule(flowData: HttpFlowData): com.sergiy.dev.mockkhttp.store.MockkRulesStore.MockkRule? {
+    private fun findMatchingMockRule(flowData: HttpFlowData): MockkRule? {
+        val key = "${flowData.request.method} ${flowData.request.url}"
+        val now = System.currentTimeMillis()
+
+        val cached = mockMatchCache[key]
+        if (cached != null && now - cached.timestamp < MOCK_MATCH_CACHE_TTL_MS) {
+            return cached.rule
+        }
+
+        val rule = scanMockRules(flowData)
+
+        if (mockMatchCache.size >= MOCK_MATCH_CACHE_MAX_ENTRIES) {
+            mockMatchCache.clear()
+        }
+        mockMatchCache[key] = CachedMockMatch(rule, now)
+        return rule
+    }
+
+    /**
+     * Scan all enabled rules for the first one matching a flow.
+     */
+    private fun scanMockRules(flowData: HttpFlowData): MockkRule? {
+        // Parse the URL and its query once, not once per rule
+        val parsedUrl = try {
+            URI.create(flowData.request.url).toURL()
+        } catch (e: Exception) {
+            logger.warn("Failed to parse URL for matching: ${flowData.request.url}", e)
+            return null
+        }
+        val queryParams = parseQuery(parsedUrl.query)
+
         val allRules = mockkRulesStore.getAllRules()
 
         for (rule in allRules) {
@@ -395,7 +490,7 @@ class OkHttpInterceptorServer(private val project: Project) {
             if (rule.method != flowData.request.method) continue
 
             // Match URL pattern
-            if (!matchesUrlPattern(flowData.request.url, rule)) continue
+            if (!matchesUrlPattern(parsedUrl, queryParams, rule)) continue
 
             // Found a match!
             return rule
@@ -407,50 +502,86 @@ class OkHttpInterceptorServer(private val project: Project) {
     /**
      * Check if URL matches the pattern.
      */
-    private fun matchesUrlPattern(url: String, rule: com.sergiy.dev.mockkhttp.store.MockkRulesStore.MockkRule): Boolean {
+    private fun matchesUrlPattern(
+        parsedUrl: URL,
+        queryParams: Map<String, List<String>>,
+        rule: MockkRule
+    ): Boolean {
         try {
-            val parsedUrl = java.net.URI.create(url).toURL()
-
             // Match scheme
             if (rule.scheme.isNotEmpty() && parsedUrl.protocol != rule.scheme) {
                 return false
             }
 
             // Match host
-            if (rule.host.isNotEmpty() && !parsedUrl.host.matches(Regex(rule.host))) {
+            if (rule.host.isNotEmpty() && !compiledRegex(rule.host).matches(parsedUrl.host)) {
                 return false
             }
 
             // Match path
-            if (rule.path.isNotEmpty() && !parsedUrl.path.matches(Regex(rule.path))) {
+            if (rule.path.isNotEmpty() && !compiledRegex(rule.path).matches(parsedUrl.path)) {
                 return false
             }
 
-            // Match query parameters if specified
-            // (Simple implementation - just check if all required params exist)
-            if (rule.queryParams.isNotEmpty()) {
-                val query = parsedUrl.query ?: ""
-                for (param in rule.queryParams) {
-                    if (!query.contains("${param.key}=${param.value}")) {
-                        return false
+            // Match query parameters (same semantics as MockkRulesStore structured matching).
+            // Optional params and blank rows are ignored; a repeated key matches if any of its values does.
+            for (param in rule.queryParams) {
+                if (!param.required || param.key.isEmpty()) continue
+
+                val actualValues = queryParams[param.key] ?: return false
+
+                val valueMatches = when (param.matchType) {
+                    MatchType.EXACT -> param.value in actualValues
+                    MatchType.WILDCARD -> true  // Presence is enough
+                    MatchType.REGEX -> try {
+                        val regex = compiledRegex(param.value)
+                        actualValues.any { regex.matches(it) }
+                    } catch (_: Exception) {
+                        false
                     }
                 }
+                if (!valueMatches) return false
             }
 
             return true
         } catch (e: Exception) {
-            logger.warn("Failed to parse URL for matching: $url", e)
+            logger.warn("Failed to match URL against rule ${rule.name}", e)
             return false
         }
     }
 
+    /**
+     * Get the compiled Regex for a rule pattern, compiling it on first use.
+     */
+    private fun compiledRegex(pattern: String): Regex {
+        return regexCache.getOrPut(pattern) { Regex(pattern) }
+    }
+
+    /**
+     * Parse a raw query string into key -> values in a single pass.
+     * Keys without '=' map to "". Repeated keys keep all their values in order.
+     */
+    private fun parseQuery(query: String?): Map<String, List<String>> {
+        if (query.isNullOrEmpty()) return emptyMap()
+
+        val params = HashMap<String, MutableList<String>>()
+        for (pair in query.split('&')) {
+            if (pair.isEmpty()) continue
+            val separator = pair.indexOf('=')
+            val key = if (separator < 0) pair else pair.substring(0, separator)
+            val value = if (separator < 0) "" else pair.substring(separator + 1)
+            params.getOrPut(key) { mutableListOf() }.add(value)
+        }
+        return params
+    }
+
     /**
      * Convert Android flow data to HttpFlowData.
      */
     private fun convertToHttpFlowData(androidFlow: AndroidFlowData): HttpFlowData {
         val url = androidFlow.request.url
         val parsedUrl = try {
-            java.net.URI.create(url).toURL()
+            URI.create(url).toURL()
         } catch (e: Exception) {
             null
         }
@@ -492,7 +623,8 @@ data class AndroidFlowData(
     val timestamp: Long,
     val duration: Long,
     val projectId: String? = null,      // Optional: helps route to correct project
-    val packageName: String? = null     // Optional: app package name for routing
+    val packageName: String? = null,    // Optional: app package name for routing
+    val debugTimeoutMs: Long? = null    // Optional: how long the app waits for a paused flow
 )
 
 data class AndroidRequestData(
@@ -505,7 +637,9 @@ data class AndroidRequestData(
 data class AndroidResponseData(
     val statusCode: Int,
     val headers: Map<String, String>,
-    val body: String
+    val body: String,
+    val bodyTruncated: Boolean = false,  // True if body was cut off at the interceptor's size cap
+    val originalSize: Long = -1          // Content-Length of the original body, -1 if unknown
 )
 
 data class ModifiedResponseData(
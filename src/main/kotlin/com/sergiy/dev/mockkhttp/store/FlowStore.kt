@@ -46,11 +46,9 @@ class FlowStore(project: Project) {
     fun addFlow(flow: HttpFlowData) {
         logger.debug("Adding flow to store: ${flow.flowId}")
 
-        // Check if flow already exists (update case)
-        val isUpdate = flows.containsKey(flow.flowId)
-
-        // Add/update flow
-        flows[flow.flowId] = flow
+        // Add/update flow (previous value present = update case)
+        val oldFlow = flows.put(flow.flowId, flow)
+        val isUpdate = oldFlow != null
 
         if (!isUpdate) {
             // New flow
@@ -87,7 +85,6 @@ class FlowStore(project: Project) {
             logger.debug("Flow updated: ${flow.flowId}")
 
             // Update paused count
-            val oldFlow = flows[flow.flowId]
             if (oldFlow?.paused == true && !flow.paused) {
                 pausedFlowsCount--
             } else if (oldFlow?.paused == false && flow.paused) {
@@ -30,6 +30,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
     private val ruleRemovedListeners = mutableListOf<(MockkRule) -> Unit>()
     private val collectionAddedListeners = mutableListOf<(com.sergiy.dev.mockkhttp.model.MockkCollection) -> Unit>()
     private val collectionRemovedListeners = mutableListOf<(com.sergiy.dev.mockkhttp.model.MockkCollection) -> Unit>()
+    private val rulesChangedListeners = mutableListOf<() -> Unit>()
 
     companion object {
         fun getInstance(project: Project): MockkRulesStore {
@@ -68,6 +69,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
         migrateOldRulesToDefaultCollection()
 
         logger.info("📚 Loaded ${collections.size} collection(s) and ${rules.size} mock rule(s) from storage")
+        notifyRulesChanged()
     }
 
     /**
@@ -135,6 +137,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
 
         // Notify listeners
         ruleAddedListeners.forEach { it(rule) }
+        notifyRulesChanged()
 
         return rule
     }
@@ -162,6 +165,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
 
         // Notify listeners
         collectionAddedListeners.forEach { it(collection) }
+        notifyRulesChanged()
 
         return collection
     }
@@ -184,6 +188,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
 
         // Notify listeners
         collectionRemovedListeners.forEach { it(collection) }
+        notifyRulesChanged()
     }
 
     /**
@@ -220,6 +225,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
     fun moveRule(rule: MockkRule, targetCollectionId: String) {
         rule.collectionId = targetCollectionId
         logger.info("📦 Moved rule '${rule.name}' to collection: $targetCollectionId")
+        notifyRulesChanged()
     }
 
     /**
@@ -235,6 +241,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
 
         // Notify listeners
         ruleAddedListeners.forEach { it(duplicated) }
+        notifyRulesChanged()
 
         return duplicated
     }
@@ -250,6 +257,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
         enabled?.let { collection.enabled = it }
 
         logger.info("🔄 Updated collection: ${collection.name}")
+        notifyRulesChanged()
     }
 
     /**
@@ -273,6 +281,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
         if (rules.remove(rule)) {
             logger.info("➖ Removed mock rule: ${rule.name}")
             ruleRemovedListeners.forEach { it(rule) }
+            notifyRulesChanged()
         }
     }
 
@@ -289,6 +298,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
     fun setRuleEnabled(rule: MockkRule, enabled: Boolean) {
         rule.enabled = enabled
         logger.info("${if (enabled) "✅" else "⏸"} Rule ${rule.name} ${if (enabled) "enabled" else "disabled"}")
+        notifyRulesChanged()
     }
 
     /**
@@ -472,6 +482,18 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
         ruleRemovedListeners.add(listener)
     }
 
+    /**
+     * Add listener for any change that can affect rule matching
+     * (rules or collections added, removed, moved, enabled or disabled).
+     */
+    fun addRulesChangedListener(listener: () -> Unit) {
+        rulesChangedListeners.add(listener)
+    }
+
+    private fun notifyRulesChanged() {
+        rulesChangedListeners.forEach { it() }
+    }
+
     // ========== IMPORT/EXPORT METHODS ==========
 
     /**
@@ -596,6 +618,7 @@ class MockkRulesStore(project: Project) : PersistentStateComponent<MockkRulesSto
             }
 
             logger.info("✅ Import complete: ${importedCollections.size} collection(s), total ${exportData.collections.sumOf { it.rules.size }} rule(s)")
+            notifyRulesChanged()
             return importedCollections
 
         } catch (e: Exception) {
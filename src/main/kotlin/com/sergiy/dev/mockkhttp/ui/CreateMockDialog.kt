@@ -664,17 +664,6 @@ class CreateMockDialog(
         return panel
     }
 
-    private fun formatJsonIfPossible(content: String): String {
-        if (content.isBlank()) return content
-        return try {
-            val gson = com.google.gson.GsonBuilder().setPrettyPrinting().create()
-            val jsonElement = com.google.gson.JsonParser.parseString(content)
-            gson.toJson(jsonElement)
-        } catch (_: Exception) {
-            content
-        }
-    }
-
     override fun doValidate(): ValidationInfo? {
         if (nameField.text.isBlank()) {
             return ValidationInfo("Rule name is required", nameField)
@@ -481,23 +481,6 @@ class DebugInterceptDialog(
         return headers
     }
 
-    /**
-     * Try to format content as JSON if it's valid JSON, otherwise return as-is.
-     */
-    private fun formatJsonIfPossible(content: String): String {
-        if (content.isBlank()) return content
-
-        return try {
-            // Try to parse and pretty-print JSON
-            val gson = com.google.gson.GsonBuilder().setPrettyPrinting().create()
-            val jsonElement = com.google.gson.JsonParser.parseString(content)
-            gson.toJson(jsonElement)
-        } catch (_: Exception) {
-            // Not valid JSON, return original
-            content
-        }
-    }
-
     // ========== Request Search functionality ==========
 
     private fun createRequestSearchPanel(): JPanel {
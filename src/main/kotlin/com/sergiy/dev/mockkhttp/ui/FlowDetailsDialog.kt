@@ -352,22 +352,6 @@ class FlowDetailsDialog(
         return sb.toString()
     }
 
-    /**
-     * Format JSON with pretty printing if valid, otherwise return as-is.
-     */
-    private fun formatJsonIfPossible(content: String): String {
-        if (content.isBlank()) return content
-
-        return try {
-            val gson = com.google.gson.GsonBuilder().setPrettyPrinting().create()
-            val jsonElement = com.google.gson.JsonParser.parseString(content)
-            gson.toJson(jsonElement)
-        } catch (_: Exception) {
-            // Not valid JSON, return original
-            content
-        }
-    }
-
     override fun createActions(): Array<Action> {
         return arrayOf(okAction)
     }
@@ -0,0 +1,25 @@
+package com.sergiy.dev.mockkhttp.ui
+
+import com.google.gson.Gson
+import com.google.gson.GsonBuilder
+import com.google.gson.JsonParser
+
+private val prettyGson: Gson = GsonBuilder().setPrettyPrinting().create()
+
+/**
+ * Format content as pretty-printed JSON if it's a valid JSON object or array, otherwise return as-is.
+ */
+internal fun formatJsonIfPossible(content: String): String {
+    if (content.isBlank()) return content
+
+    // Only objects/arrays are worth formatting; skip the parse (and its exception) for HTML, text, etc.
+    val first = content.first { !it.isWhitespace() }
+    if (first != '{' && first != '[') return content
+
+    return try {
+        prettyGson.toJson(JsonParser.parseString(content))
+    } catch (_: Exception) {
+        // Not valid JSON, return original
+        content
+    }
+}